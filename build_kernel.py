@@ -0,0 +1,31 @@
+"""
+Build the optional Cython sampling kernel (markov_kernel.pyx) in place.
+
+A manual, optional step (`pip install cython setuptools`, then
+`python build_kernel.py`); installs never run it. Without Cython or a C
+compiler it warns and exits cleanly, since markov.py samples with numba
+or pure Python without the kernel.
+"""
+import sys
+
+
+def build():
+    from Cython.Build import cythonize
+    from setuptools import Distribution, Extension
+
+    extensions = cythonize(
+        [Extension("markov_kernel", ["markov_kernel.pyx"], extra_compile_args=["-O3"])],
+        language_level=3,
+    )
+    dist = Distribution({"name": "markov_kernel", "ext_modules": extensions})
+    cmd = dist.get_command_obj("build_ext")
+    cmd.inplace = True
+    cmd.ensure_finalized()
+    cmd.run()
+
+
+if __name__ == "__main__":
+    try:
+        build()
+    except Exception as e:
+        print(f"Warning: skipping the optional Cython kernel: {e}", file=sys.stderr)
@@ -1,29 +1,79 @@
 from __future__ import annotations
 import argparse
 import glob
+import hashlib
+import importlib.util
+import os
+import tempfile
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
 from rich import print
-from markov import MarkovChain
-
-def read_corpus(paths):
-    import os
-    parts = []
-    for p in paths:
-        try:
-            with open(p, "r", encoding="utf-8", errors="ignore") as f:
-                parts.append(f.read())
-        except Exception as e:
-            print(f"Warning: failed to read {p}: {e}")
-    return "\n".join(parts)
+from markov import MarkovChain, iter_file_chunks
+
+# Bump when the tokenizer or the saved model format changes, so stale
+# cached chains are rebuilt rather than loaded
+_MARKOV_CACHE_VERSION = 1
+
+def _markov_cache_path(cache_dir, files, order):
+    # Keyed on the corpus files, their mtimes, the order, the cache version
+    # and the file format, so editing or adding a file, changing --order or
+    # upgrading builds a fresh chain
+    ext = ".json.zst" if importlib.util.find_spec("zstandard") is not None else ".json.gz"
+    key_src = repr(sorted((p, os.path.getmtime(p)) for p in files) + [order, _MARKOV_CACHE_VERSION, ext])
+    key = hashlib.sha256(key_src.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"mc-{key}{ext}")
+
+def _save_atomic(mc, path):
+    # Save under a temporary name with the same extension, then rename, so
+    # an interrupted run or a concurrent one never leaves a partial cache file
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    name = os.path.basename(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=name[name.index("."):])
+    os.close(fd)
+    try:
+        mc.save(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def _model_dtype(device):
+    # bf16 halves weight/KV-cache traffic vs fp32 and, unlike fp16, keeps
+    # fp32's range; use it wherever the hardware has native support
+    if device == "cuda":
+        return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+    if _cpu_has_native_bf16():
+        return torch.bfloat16
+    return torch.float32
+
+def _cpu_has_native_bf16():
+    # AVX512-BF16 or AMX run bf16 matmuls natively; plain AVX-512 only
+    # emulates them and is slower than fp32. Older torch builds lack these
+    # probes, in which case stay on fp32
+    cpu = getattr(torch._C, "_cpu", None)
+    for probe in ("_is_avx512_bf16_supported", "_is_amx_tile_supported"):
+        supported = getattr(cpu, probe, None)
+        if supported is not None and supported():
+            return True
+    return False
+
+def _attn_implementation(device):
+    # FlashAttention-2 needs CUDA and the flash_attn package; otherwise None
+    # leaves the choice to transformers, since forcing "sdpa" fails on
+    # models without SDPA support
+    if device == "cuda" and importlib.util.find_spec("flash_attn") is not None:
+        return "flash_attention_2"
+    return None
 
 def main():
     ap = argparse.ArgumentParser(description="Raw continuation with HF Transformers (no instruction prompt). Supports loading a prebuilt Markov model.")
     ap.add_argument("--model", default="Qwen/Qwen2.5-0.5B", help="HF model id (base/causal LM preferred)")
     ap.add_argument("--device", default="cpu", help="cpu or cuda")
     ap.add_argument("--corpus", nargs="+", help="Paths/globs to plain-text corpus files (used if --markov-path not provided)")
-    ap.add_argument("--markov-path", help="Path to a saved Markov model (JSON or JSON.gz). If provided, corpus reading is skipped.", default="models/corpus-order3.json.gz")
+    ap.add_argument("--markov-path", help="Path to a saved Markov model (JSON, JSON.gz, JSON.zst or Parquet). If provided, corpus reading is skipped; defaults to models/corpus-order3.json.gz without --corpus.", default=None)
     ap.add_argument("--order", type=int, default=3, help="Markov chain order (used only when building from corpus)")
+    ap.add_argument("--markov-cache-dir", default="cache", help="Where chains built from --corpus are saved and reused on later runs")
     ap.add_argument("--seed-len", type=int, default=12)
     ap.add_argument("--prefix", default="")
     ap.add_argument("--count", type=int, default=10)
@@ -31,36 +81,63 @@ def main():
     ap.add_argument("--temperature", type=float, default=0.85)
     ap.add_argument("--top-p", type=float, default=0.9)
     ap.add_argument("--rng-seed", type=int, default=None)
+    ap.add_argument("--compiled-sampler", action="store_true", help="Sample seeds with the numba/Cython kernel; pays off from a few thousand seeds (--count)")
+    ap.add_argument("--int8", action="store_true", help="Load weights 8-bit quantized via bitsandbytes (CUDA only)")
     args = ap.parse_args()
 
-    torch.set_grad_enabled(False)
     device = torch.device(args.device)
 
+    if args.int8 and args.device != "cuda":
+        raise SystemExit("--int8 requires --device cuda.")
+
     tokenizer = AutoTokenizer.from_pretrained(args.model)
+    load_kwargs = {}
+    attn_implementation = _attn_implementation(args.device)
+    if attn_implementation is not None:
+        load_kwargs["attn_implementation"] = attn_implementation
+    if args.int8:
+        # bitsandbytes places the quantized weights itself
+        load_kwargs["quantization_config"] = BitsAndBytesConfig(load_in_8bit=True)
+        load_kwargs["device_map"] = {"": device}
     model = AutoModelForCausalLM.from_pretrained(
         args.model,
-        torch_dtype=torch.float16 if args.device == "cuda" else torch.float32
+        torch_dtype=_model_dtype(args.device),
+        **load_kwargs,
     )
-    model.to(device)
+    if not args.int8:
+        model.to(device)
     model.eval()
+    if args.device == "cuda" and not args.int8:
+        # Compile the forward pass (generate() itself stays eager); a static
+        # KV cache keeps shapes fixed so the CUDA graphs are reused per step
+        model.generation_config.cache_implementation = "static"
+        model.forward = torch.compile(model.forward, mode="reduce-overhead", fullgraph=False)
 
     from random import Random
     rng = Random(args.rng_seed)
 
-    if args.markov_path:
-        mc = MarkovChain.load(args.markov_path)
+    if args.markov_path or not args.corpus:
+        mc = MarkovChain.load(args.markov_path or "models/corpus-order3.json.gz")
     else:
-        if not args.corpus:
-            raise SystemExit("Either provide --markov-path or --corpus globs.")
-        text = read_corpus([p for spec in args.corpus for p in glob.glob(spec)])
-        mc = MarkovChain(order=args.order)
-        mc.add_text(text)
-
-    for i in range(args.count):
-        seed_words = mc.generate_seed_text(n_words=args.seed_len, rng=rng)
-        print(f"[red b]Seed: {seed_words}[/red b]")
-        context = f"{args.prefix} {seed_words}".strip() if args.prefix else seed_words
-        inputs = tokenizer(context, return_tensors="pt").to(device)
+        files = [p for spec in args.corpus for p in glob.glob(spec)]
+        cache_path = _markov_cache_path(args.markov_cache_dir, files, args.order)
+        if os.path.exists(cache_path):
+            mc = MarkovChain.load(cache_path)
+        else:
+            mc = MarkovChain(order=args.order)
+            mc.add_stream(iter_file_chunks(files))
+            _save_atomic(mc, cache_path)
+
+    seeds = mc.generate_seed_texts(args.count, n_words=args.seed_len, rng=rng, compiled=args.compiled_sampler)
+    contexts = [f"{args.prefix} {seed_words}".strip() if args.prefix else seed_words for seed_words in seeds]
+
+    # One left-padded batch: every prompt ends at the same column, so the
+    # continuations are simply the columns after the padded prompt width
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    inputs = tokenizer(contexts, return_tensors="pt", padding=True).to(device)
+    with torch.inference_mode():
         out_ids = model.generate(
             **inputs,
             do_sample=True,
@@ -68,10 +145,13 @@ def main():
             top_p=args.top_p,
             max_new_tokens=args.max_new_tokens,
             repetition_penalty=1.05,
-            pad_token_id=tokenizer.eos_token_id,
+            pad_token_id=tokenizer.pad_token_id,
         )
-        full = tokenizer.decode(out_ids[0], skip_special_tokens=True)
-        print(full[len(context):].strip())
+    continuations = tokenizer.batch_decode(out_ids[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+    for seed_words, text in zip(seeds, continuations):
+        print(f"[red b]Seed: {seed_words}[/red b]")
+        print(text.strip())
         print("---")
 
 if __name__ == "__main__":
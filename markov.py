@@ -1,138 +1,768 @@
 from __future__ import annotations
 import re
+import io
 import json
 import gzip
-from collections import defaultdict
-from typing import Dict, List, Tuple, Optional
+from functools import lru_cache
+from itertools import chain, islice
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, List, Mapping, Tuple, Optional
 import random
 import os
+import sys
 
-_word_re = re.compile(r"[A-Za-zÀ-ÿ']+|[.?!]")
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    import zstandard as zstd
+except ImportError:  # optional: only needed for .zst models
+    zstd = None
+
+# Words and sentence punctuation. Any replacement backend only needs a
+# compatible .findall(text) -> List[str].
+_WORD_CHARS = "A-Za-zÀ-ÿ'"
+_TOKEN_PATTERN = rf"[{_WORD_CHARS}]+|[.?!]"
+_TOKENIZER = re.compile(_TOKEN_PATTERN)
+_WORD_CHAR_RE = re.compile(f"[{_WORD_CHARS}]")
+# Sentence punctuation; every other token is a word
+_PUNCT_TOKENS = (".", "?", "!")
+
+# Model file I/O: batch json.dump's many small writes before compression
+_IO_BUFFER_SIZE = 1 << 20
+# zstd level 10 beat gzip -9 on both size and speed for JSON models; higher
+# levels shave little more off the file for several times the save time
+_ZSTD_LEVEL = 10
+# Windows added since the last merge are held as views until they outnumber
+# the merged rows (and at least this many), so each merge re-sorts a store
+# at most twice as large as what it absorbs
+_MERGE_MIN_ROWS = 1 << 22
+# States per json.dumps call when saving, so the nested transitions dict is
+# never built whole
+_JSON_BATCH_STATES = 1 << 16
 
 def tokenize(text: str) -> List[str]:
     # Simple tokenization: words and sentence punctuation
-    return _word_re.findall(text)
+    return _TOKENIZER.findall(text)
+
+def iter_file_chunks(paths: Iterable[str]) -> Iterator[str]:
+    """
+    Text of each file in `paths`, in fixed-size chunks and followed by a
+    newline, for MarkovChain.add_stream; the corpus never sits in memory
+    whole. Unreadable files are skipped with a warning.
+    """
+    for p in paths:
+        try:
+            with open(p, "r", encoding="utf-8", errors="ignore") as f:
+                while chunk := f.read(_IO_BUFFER_SIZE):
+                    yield chunk
+        except Exception as e:
+            print(f"Warning: failed to read {p}: {e}")
+        yield "\n"
+
+@lru_cache(maxsize=None)
+def _state_getter(order: int):
+    """
+    Return get_state(inv, ids) -> token tuple with `order` unrolled, e.g.
+    (inv[ids[0]], inv[ids[1]]) for order 2. Generated once per order; it
+    skips the map()/tuple() iterator overhead on every state and start.
+    """
+    items = "".join(f"inv[ids[{i}]], " for i in range(order))
+    namespace: dict = {}
+    exec(f"def get_state(inv, ids):\n    return ({items})\n", namespace)
+    return namespace["get_state"]
+
+@lru_cache(maxsize=None)
+def _load_sampler():
+    """
+    The numba kernel (markov_jit) if numba is installed, else the Cython one
+    (markov_kernel, built by `python build_kernel.py`) if present, else None.
+    numba measured no slower than Cython, so it wins when both exist. Both
+    take the same arguments. Only generate_words(compiled=True) imports it,
+    so building and saving chains never loads numba.
+    """
+    try:
+        from markov_jit import sample_path
+        return sample_path
+    except ImportError:
+        pass
+    try:
+        from markov_kernel import sample_ids
+        return sample_ids
+    except ImportError:
+        return None
 
 class MarkovChain:
     """
     Markov chain with weighted transitions and (de)serialization support.
 
-    transitions: Dict[state_tuple, Dict[next_token, count]]
-    starts: List[state_tuple] (possible starting states)
+    transitions: Mapping[state_tuple, Mapping[next_token, count]]
+    starts: Tuple[state_tuple, ...] (possible starting states)
+
+    Both are read-only views of the id-based counts; add text, or assign a
+    whole new value, to change them. Unlike the defaultdicts they replace,
+    looking up a missing state raises KeyError (use .get) and the maps
+    cannot be updated in place.
+
+    Sampling runs on a CSR copy of `transitions` built by finalize(): the
+    transitions of state id `s` are next_ids[state_ptr[s]:state_ptr[s+1]]
+    with running totals in the matching slice of cum_weights.
     """
     def __init__(self, order: int = 2):
         if order < 1:
             raise ValueError("order must be >= 1")
         self.order = order
-        self.transitions: Dict[Tuple[str, ...], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
-        self.starts: List[Tuple[str, ...]] = []
+        # Counts are kept columnar while building: each distinct (state, next)
+        # id row once, in sorted order, with its count and the position of
+        # the window it first appeared in. Windows added since the last merge
+        # wait in `_pending`; start states are id rows too.
+        self._rows = np.zeros((0, order + 1), dtype=np.int32)
+        self._row_counts = np.zeros(0, dtype=np.int64)
+        self._row_first = np.zeros(0, dtype=np.int64)
+        self._pending: List[np.ndarray] = []
+        self._pending_n = 0
+        self._n_merged = 0
+        self._start_rows: List[np.ndarray] = []
+        # Token views of the counts, built on first read after a change
+        self._transitions: Optional[Mapping[Tuple[str, ...], Mapping[str, int]]] = None
+        self._starts: Optional[Tuple[Tuple[str, ...], ...]] = None
+        # Token interning used while building: token -> id and id -> token
+        # Punctuation always takes the first ids, so "is punctuation" is
+        # a single vectorized compare: id < len(_PUNCT_TOKENS)
+        self._vocab: Dict[str, int] = {t: i for i, t in enumerate(_PUNCT_TOKENS)}
+        self._inv_vocab: List[str] = list(_PUNCT_TOKENS)
+        # CSR sampling tables, rebuilt by finalize() after new counts
+        self._finalized = False
+        self._state_ptr = np.zeros(1, dtype=np.int32)
+        self._next_ids = np.zeros(0, dtype=np.int32)
+        self._cum_weights = np.zeros(0, dtype=np.int32)
+        # Per-state ((next_id, next_sid) edges, cum_weights) lists for the pure-Python sampler
+        self._cache: Dict[int, Tuple[List[Tuple[int, int]], List[int]]] = {}
+        # State reached by each transition (-1 if it has none), start states
+        # as ids, and an alpha flag per vocab id; lets both samplers walk
+        # the chain on integer state ids alone
+        self._next_sids = np.zeros(0, dtype=np.int32)
+        self._start_ids = np.zeros((0, order), dtype=np.int32)
+        self._start_sids = np.zeros(0, dtype=np.int32)
+        self._is_alpha = np.zeros(0, dtype=np.uint8)
+        # Corpus-wide running totals and each state's offset into them, so
+        # many states can be sampled with one searchsorted (sample_many)
+        self._global_cum = np.zeros(0, dtype=np.int64)
+        self._state_base = np.zeros(0, dtype=np.int64)
+
+    def __getstate__(self) -> dict:
+        # The cached views hold MappingProxyTypes, which cannot be pickled;
+        # they are rebuilt on first read
+        state = self.__dict__.copy()
+        state["_transitions"] = None
+        state["_starts"] = None
+        return state
+
+    def _token_ids(self, tokens: List[str]) -> np.ndarray:
+        vocab = self._vocab
+        ids = np.fromiter(
+            (vocab.setdefault(t, len(vocab)) for t in tokens), dtype=np.int32, count=len(tokens)
+        )
+        # dicts keep insertion order, so new tokens are exactly the tail of the
+        # vocab; intern them so chains loaded in the same process share them
+        self._inv_vocab.extend(map(sys.intern, islice(vocab, len(self._inv_vocab), None)))
+        return ids
 
     def add_text(self, text: str):
         tokens = tokenize(text)
         if len(tokens) <= self.order:
             return
-        # naive sentence boundary detection by punctuation
-        sent_starts = [0]
-        for i, tok in enumerate(tokens):
-            if tok in (".", "?", "!") and i + 1 < len(tokens):
-                sent_starts.append(i + 1)
-
-        for s in sent_starts:
-            if s + self.order < len(tokens):
-                self.starts.append(tuple(tokens[s : s + self.order]))
-
-        for i in range(len(tokens) - self.order):
-            state = tuple(tokens[i : i + self.order])
-            nxt = tokens[i + self.order]
-            self.transitions[state][nxt] += 1
-
-    def _next_weighted(self, state: Tuple[str, ...], rng: random.Random) -> Optional[str]:
-        dist = self.transitions.get(state)
-        if not dist:
-            return None
-        total = sum(dist.values())
-        r = rng.randrange(total)
-        cum = 0
-        for tok, count in dist.items():
-            cum += count
-            if r < cum:
-                return tok
-        # Should not happen
-        return None
+        self._add_ids(self._token_ids(tokens))
+
+    def add_stream(self, chunks: Iterable[str]):
+        """
+        Add text that arrives in pieces (e.g. successive file reads) as one
+        continuous token stream, equivalent to add_text("".join(chunks)).
+        Only the word fragment at the end of a chunk and the last `order`
+        token ids are carried between chunks, so memory stays bounded by
+        the chunk size rather than the corpus size.
+        """
+        order = self.order
+        carry = np.zeros(0, dtype=np.int32)
+        first_is_start = True
+        tail = ""
+        for chunk in chain(chunks, [None]):
+            if chunk is None:
+                # end of stream: the held-back fragment is complete
+                text, tail = tail, ""
+            else:
+                text = tail + chunk
+                # hold back a trailing word run, it may continue in the next chunk
+                cut = len(text)
+                while cut and _WORD_CHAR_RE.match(text, cut - 1):
+                    cut -= 1
+                text, tail = text[:cut], text[cut:]
+            ids = np.concatenate((carry, self._token_ids(tokenize(text))))
+            if len(ids) > order:
+                first_is_start = self._add_ids(ids, first_is_start)
+                carry = ids[-order:]
+            else:
+                carry = ids
+
+    def _add_ids(self, ids: np.ndarray, first_is_start: bool = True) -> bool:
+        """
+        Count every (order + 1)-window of `ids`, which must be longer than
+        `order`. `first_is_start` says whether the window at ids[0] begins a
+        sentence; the return value says the same for the window that would
+        follow the last one counted here.
+        """
+        order = self.order
+
+        # (N - order, order + 1) view: each row is a state followed by its next token
+        windows = sliding_window_view(ids, order + 1)
+
+        # naive sentence boundary detection by punctuation: a window starts a
+        # sentence if it is the first one or follows a punctuation token
+        is_punct = ids < len(_PUNCT_TOKENS)
+        is_start = np.empty(len(windows), dtype=bool)
+        is_start[0] = first_is_start
+        is_start[1:] = is_punct[: len(windows) - 1]
+        self._start_rows.append(windows[is_start, :order])
+
+        # Windows are a view of `ids`; they are copied and counted on merge
+        self._pending.append(windows)
+        self._pending_n += len(windows)
+        if self._pending_n >= max(len(self._rows), _MERGE_MIN_ROWS):
+            self._merge_pending()
+        self._changed()
+        return bool(is_punct[len(windows) - 1])
+
+    @property
+    def transitions(self) -> Mapping[Tuple[str, ...], Mapping[str, int]]:
+        if self._transitions is None:
+            self._transitions = MappingProxyType(self._nested_counts(read_only=True))
+        return self._transitions
+
+    @transitions.setter
+    def transitions(self, value: Mapping[Tuple[str, ...], Mapping[str, int]]):
+        states = self._token_ids([t for state in value for t in state]).reshape(-1, self.order)
+        next_ids = self._token_ids([t for next_map in value.values() for t in next_map])
+        counts = np.fromiter(
+            (c for next_map in value.values() for c in next_map.values()), dtype=np.int64, count=len(next_ids)
+        )
+        sizes = [len(next_map) for next_map in value.values()]
+        self._set_counts(states, sizes, next_ids, counts)
+
+    def _set_counts(self, states: np.ndarray, sizes, next_ids: np.ndarray, counts: np.ndarray):
+        """
+        Replace all counts: state `s` of the (S, order) `states` ids has the
+        next `sizes[s]` entries of `next_ids` and `counts`, in text order.
+        """
+        rows = np.column_stack((np.repeat(states, sizes, axis=0), next_ids))
+        self._pending = []
+        self._pending_n = 0
+        self._n_merged = len(rows)
+        self._rows, self._row_counts, self._row_first = _sum_rows(
+            rows, counts, np.arange(len(rows)), len(self._inv_vocab)
+        )
+        self._changed()
+
+    @property
+    def starts(self) -> Tuple[Tuple[str, ...], ...]:
+        if self._starts is None:
+            inv = self._inv_vocab
+            get_state = _state_getter(self.order)
+            self._starts = tuple([get_state(inv, row) for row in self._start_array().tolist()])
+        return self._starts
+
+    @starts.setter
+    def starts(self, value: Iterable[Tuple[str, ...]]):
+        self._start_rows = [self._token_ids([t for state in value for t in state]).reshape(-1, self.order)]
+        self._changed()
+
+    def _start_array(self) -> np.ndarray:
+        """All start states as one (K, order) id array."""
+        if len(self._start_rows) != 1:
+            self._start_rows = [np.concatenate([np.zeros((0, self.order), dtype=np.int32), *self._start_rows])]
+        return self._start_rows[0]
+
+    def _changed(self):
+        """Drop everything derived from the counts after they change."""
+        self._finalized = False
+        self._transitions = None
+        self._starts = None
+
+    def _merge_pending(self):
+        """Fold pending windows into the sorted distinct rows and their counts."""
+        if not self._pending:
+            return
+        rows = np.concatenate([self._rows, *self._pending])
+        counts = np.concatenate((self._row_counts, np.ones(self._pending_n, dtype=np.int64)))
+        first = np.concatenate((self._row_first, np.arange(self._n_merged, self._n_merged + self._pending_n)))
+        self._n_merged += self._pending_n
+        self._pending = []
+        self._pending_n = 0
+        self._rows, self._row_counts, self._row_first = _sum_rows(rows, counts, first, len(self._inv_vocab))
+
+    def _nested_counts(self, join: Optional[str] = None, read_only: bool = False) -> dict:
+        """
+        Counts as {state: {next token: count}} in text order. States are
+        token tuples, or strings of their tokens joined by `join`; with
+        `read_only` each next map is wrapped in a MappingProxyType.
+        """
+        return next(self._nested_batches(join, read_only), {})
+
+    def _nested_batches(
+        self, join: Optional[str] = None, read_only: bool = False, batch_states: Optional[int] = None
+    ) -> Iterator[dict]:
+        """
+        _nested_counts() split into dicts of `batch_states` consecutive
+        states each (one dict if None), built one at a time.
+        """
+        state_ids, state_ptr, next_ids, counts = self._transition_arrays(text_order=True)
+        inv = self._inv_vocab
+        n_states = len(state_ids)
+        for lo in range(0, n_states, batch_states or n_states or 1):
+            hi = min(lo + (batch_states or n_states), n_states)
+            # Token columns zipped into tuples one state at a time; far
+            # smaller than a list per state from state_ids.tolist()
+            states = zip(*([inv[i] for i in col.tolist()] for col in state_ids[lo:hi].T))
+            if join is not None:
+                states = map(join.join, states)
+            # Each state takes its next `size` (token, count) pairs off one iterator
+            edges = slice(state_ptr[lo], state_ptr[hi])
+            pairs = iter(list(zip([inv[i] for i in next_ids[edges].tolist()], counts[edges].tolist())))
+            next_maps = [dict(islice(pairs, size)) for size in np.diff(state_ptr[lo : hi + 1]).tolist()]
+            if read_only:
+                next_maps = map(MappingProxyType, next_maps)
+            yield dict(zip(states, next_maps))
+
+    def _transition_arrays(self, text_order: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Split the count rows into CSR int32 arrays:
+        (state_ids[S, order], state_ptr[S+1], next_ids[E], counts[E]).
+        Transitions of state `s` are rows state_ptr[s]:state_ptr[s+1].
+
+        States and their transitions come in sorted id order, or with
+        `text_order` in the order they first appeared in the text, which is
+        the order the original dict-of-dicts builder stored them in.
+        """
+        self._merge_pending()
+        order = self.order
+        rows = self._rows
+        first = np.ones(len(rows), dtype=bool)
+        np.any(rows[1:, :order] != rows[:-1, :order], axis=1, out=first[1:])
+        starts = np.flatnonzero(first)
+        state_ids = rows[starts, :order]
+        next_ids = rows[:, order]
+        counts = self._row_counts.astype(np.int32)
+        sizes = np.diff(np.append(starts, len(rows)))
+        if text_order and len(rows):
+            # A state first appeared with its earliest transition
+            state_first = np.minimum.reduceat(self._row_first, starts)
+            edges = np.lexsort((self._row_first, np.repeat(state_first, sizes)))
+            states = np.argsort(state_first)
+            state_ids, sizes, next_ids, counts = state_ids[states], sizes[states], next_ids[edges], counts[edges]
+        state_ptr = np.zeros(len(sizes) + 1, dtype=np.int32)
+        np.cumsum(sizes, out=state_ptr[1:])
+        return state_ids, state_ptr, np.ascontiguousarray(next_ids), counts
+
+    def finalize(self):
+        """
+        Build the CSR sampling tables from the count rows. generate_words
+        calls this lazily whenever counts have changed since the last build.
+        """
+        self._build_tables(*self._transition_arrays())
 
-    def generate_words(self, n_words: int, rng: random.Random) -> List[str]:
-        if not self.starts:
+    def _build_tables(self, state_ids: np.ndarray, state_ptr: np.ndarray, next_ids: np.ndarray, counts: np.ndarray):
+        """Build the sampling tables from _transition_arrays()-shaped CSR arrays."""
+        # Per-state running totals: global cumsum minus the total before each state
+        global_cum = np.cumsum(counts, dtype=np.int64)
+        before = np.concatenate(([0], global_cum))[state_ptr[:-1]]
+        cum = global_cum - np.repeat(before, np.diff(state_ptr))
+        self._state_ptr = state_ptr
+        self._next_ids = next_ids
+        self._cum_weights = cum.astype(np.int32)
+        self._global_cum = global_cum
+        self._state_base = before
+        self._cache = {}
+
+        # Tables that let the samplers follow transitions without building
+        # tuples: the state each edge leads to (its state shifted left by
+        # the next token), and starts as ids
+        base = len(self._inv_vocab)
+        edge_states = np.column_stack((np.repeat(state_ids[:, 1:], np.diff(state_ptr), axis=0), next_ids))
+        self._next_sids = _find_rows(state_ids, edge_states, base)
+        self._start_ids = self._start_array()
+        self._start_sids = _find_rows(state_ids, self._start_ids, base)
+        self._is_alpha = (np.arange(len(self._inv_vocab)) >= len(_PUNCT_TOKENS)).astype(np.uint8)
+        self._finalized = True
+
+    def _next_weighted(self, sid: int, rng: random.Random) -> Tuple[int, int]:
+        """Sample a transition of state `sid`: (next token id, next state id or -1)."""
+        # Plain lists per state let random.choices bisect in C, which beats
+        # a numpy call on these short slices
+        entry = self._cache.get(sid)
+        if entry is None:
+            lo = self._state_ptr[sid]
+            hi = self._state_ptr[sid + 1]
+            edges = list(zip(self._next_ids[lo:hi].tolist(), self._next_sids[lo:hi].tolist()))
+            entry = self._cache[sid] = (edges, self._cum_weights[lo:hi].tolist())
+        edges, cum_weights = entry
+        return rng.choices(edges, cum_weights=cum_weights)[0]
+
+    def generate_words(self, n_words: int, rng: random.Random, compiled: bool = False) -> List[str]:
+        """
+        Walk the chain for `n_words` words. With `compiled` the walk runs in
+        the numba or Cython kernel: much faster per word, but loading it
+        costs ~0.3 s, and it draws from `rng` differently, so a seed gives
+        different words than the pure-Python walk.
+        """
+        if not len(self._start_array()):
             return []
-        state = rng.choice(self.starts)
-        out: List[str] = list(state)
-        # Count alpha tokens (ignore punctuation tokens)
-        def alpha_count(seq: List[str]) -> int:
-            return sum(1 for t in seq if re.match(r"[A-Za-zÀ-ÿ']+$", t))
-
-        while alpha_count(out) < n_words:
-            nxt = self._next_weighted(tuple(out[-self.order:]), rng)
-            if nxt is None:
-                # restart from a random start
-                state = rng.choice(self.starts)
-                out.extend(state)
+        if not self._finalized:
+            self.finalize()
+        if compiled:
+            sampler = _load_sampler()
+            if sampler is None:
+                raise ImportError(
+                    "compiled sampling requires numba (pip install numba) "
+                    "or the Cython kernel (python build_kernel.py)"
+                )
+            ids = sampler(
+                self._state_ptr,
+                self._next_ids,
+                self._cum_weights,
+                self._next_sids,
+                self._is_alpha,
+                self._start_ids,
+                self._start_sids,
+                n_words,
+                rng.getrandbits(32),
+            )
+            ids = np.asarray(ids)
+            inv = self._inv_vocab
+            return [inv[i] for i in ids[self._is_alpha[ids] == 1][:n_words].tolist()]
+        is_alpha = self._is_alpha
+        start_ids = self._start_ids
+        start_sids = self._start_sids
+        out: List[int] = []
+        # Running count of alpha tokens (punctuation tokens are ignored)
+        alpha_n = 0
+        # Current state id; each sampled transition carries the id of the
+        # state it leads to, so no state tuple is rebuilt per token
+        sid = -1
+
+        while alpha_n < n_words:
+            if sid < 0:
+                # (re)start from a random start
+                k = rng.randrange(len(start_sids))
+                for nxt in start_ids[k].tolist():
+                    out.append(nxt)
+                    if is_alpha[nxt]:
+                        alpha_n += 1
+                sid = int(start_sids[k])
                 continue
+            nxt, sid = self._next_weighted(sid, rng)
             out.append(nxt)
-        # Strip trailing punctuation noise and return words-only seed
-        words = [t for t in out if re.match(r"[A-Za-zÀ-ÿ']+$", t)]
+            if is_alpha[nxt]:
+                alpha_n += 1
+        # Strip punctuation and return words-only seed
+        inv = self._inv_vocab
+        words = [inv[i] for i in out if is_alpha[i]]
         return words[:n_words]
 
-    def generate_seed_text(self, n_words: int = 12, rng: Optional[random.Random] = None) -> str:
+    def sample_many(self, sids: np.ndarray, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sample one transition for each state id in `sids` (none may be -1)
+        with a single draw and searchsorted over the corpus-wide running
+        totals. Returns (next token ids, next state ids or -1).
+        """
+        lo = self._state_ptr[sids]
+        hi = self._state_ptr[sids + 1]
+        base = self._state_base[sids]
+        r = base + rng.integers(0, self._global_cum[hi - 1] - base)
+        edges = np.searchsorted(self._global_cum, r, side="right")
+        return self._next_ids[edges], self._next_sids[edges]
+
+    def generate_words_batch(self, count: int, n_words: int, rng: random.Random) -> List[List[str]]:
+        """
+        Generate `count` independent word sequences in lockstep, so each
+        step samples every unfinished sequence with one sample_many call.
+        """
+        if count <= 0 or n_words <= 0 or not len(self._start_array()):
+            return [[] for _ in range(count)]
+        if not self._finalized:
+            self.finalize()
+        np_rng = np.random.default_rng(rng.getrandbits(64))
+        is_alpha = self._is_alpha
+        sids = np.full(count, -1, dtype=np.int32)
+        alpha_n = np.zeros(count, dtype=np.int64)
+        # One (count, k) block of emitted ids per step, -1 where a row emitted nothing
+        blocks = []
+        while True:
+            active = alpha_n < n_words
+            if not active.any():
+                break
+            restart = active & (sids < 0)
+            if restart.any():
+                # (re)start rows without a state; the rest wait one step
+                k = np_rng.integers(0, len(self._start_sids), size=int(restart.sum()))
+                block = np.full((count, self.order), -1, dtype=np.int32)
+                block[restart] = self._start_ids[k]
+                sids[restart] = self._start_sids[k]
+            else:
+                nxt, next_sids = self.sample_many(sids[active], np_rng)
+                block = np.full((count, 1), -1, dtype=np.int32)
+                block[active, 0] = nxt
+                sids[active] = next_sids
+            alpha_n += ((block >= 0) & (is_alpha[block] == 1)).sum(axis=1)
+            blocks.append(block)
+        inv = self._inv_vocab
+        return [
+            [inv[i] for i in row if i >= 0 and is_alpha[i]][:n_words]
+            for row in np.hstack(blocks).tolist()
+        ]
+
+    def generate_seed_text(
+        self, n_words: int = 12, rng: Optional[random.Random] = None, compiled: bool = False
+    ) -> str:
         rng = rng or random.Random()
-        words = self.generate_words(n_words, rng)
+        words = self.generate_words(n_words, rng, compiled=compiled)
         return " ".join(words)
 
+    def generate_seed_texts(
+        self, count: int, n_words: int = 12, rng: Optional[random.Random] = None, compiled: bool = False
+    ) -> List[str]:
+        rng = rng or random.Random()
+        # The compiled kernel walks each seed faster than the numpy lockstep
+        # batch, which in turn beats per-seed Python loops
+        if compiled:
+            return [self.generate_seed_text(n_words, rng, compiled=True) for _ in range(count)]
+        return [" ".join(words) for words in self.generate_words_batch(count, n_words, rng)]
+
     def to_dict(self) -> dict:
+        data = self._dict_header()
+        data["transitions"] = self._nested_counts(join="|||")
+        return data
+
+    def _dict_header(self) -> dict:
+        """to_dict() with "transitions" left empty."""
         # Use '|||' joined strings for tuple keys to make JSON compact
-        transitions_serialized = {
-            "|||".join(state): next_map for state, next_map in self.transitions.items()
-        }
         starts_serialized = ["|||".join(state) for state in self.starts]
         return {
             "version": 1,
             "order": self.order,
             "starts": starts_serialized,
-            "transitions": transitions_serialized,
+            "transitions": {},
         }
 
+    def _write_json(self, f):
+        """
+        Write exactly what json.dump(self.to_dict(), f, ensure_ascii=False)
+        would, encoding transitions a batch of states at a time so memory
+        holds one batch rather than the whole nested dict.
+        """
+        # The header ends in '"transitions": {}}'; states go between the braces
+        f.write(json.dumps(self._dict_header(), ensure_ascii=False)[:-2])
+        sep = ""
+        for batch in self._nested_batches(join="|||", batch_states=_JSON_BATCH_STATES):
+            f.write(sep)
+            f.write(json.dumps(batch, ensure_ascii=False)[1:-1])
+            sep = ", "
+        f.write("}}")
+
     @classmethod
     def from_dict(cls, data: dict) -> "MarkovChain":
         order = int(data.get("order", 2))
         mc = cls(order=order)
         starts_serialized = data.get("starts", [])
         transitions_serialized: Dict[str, Dict[str, int]] = data.get("transitions", {})
-        mc.starts = [tuple(s.split("|||")) for s in starts_serialized]
-        mc.transitions = defaultdict(lambda: defaultdict(int))
-        for state_str, next_map in transitions_serialized.items():
-            state = tuple(state_str.split("|||"))
-            mc.transitions[state] = defaultdict(int, next_map)
+        # Straight to id arrays: one split over all keys and one vocab lookup
+        # per token, without building a tuple or dict per state. Only vocab
+        # entries keep the decoded strings, and _token_ids interns those.
+        mc._start_rows = [mc._token_ids(_split_states(starts_serialized)).reshape(-1, order)]
+        next_maps = transitions_serialized.values()
+        states = mc._token_ids(_split_states(transitions_serialized)).reshape(-1, order)
+        next_ids = mc._token_ids(list(chain.from_iterable(next_maps)))
+        counts = np.fromiter(chain.from_iterable(map(dict.values, next_maps)), dtype=np.int64, count=len(next_ids))
+        sizes = np.fromiter(map(len, next_maps), dtype=np.int64, count=len(states))
+        mc._set_counts(states, sizes, next_ids, counts)
+        return mc
+
+    def save_parquet(self, path: str):
+        """
+        Save as a one-row Parquet table whose list columns are the CSR
+        arrays load_parquet reads straight back:
+        - vocab: token string for each id
+        - state_ids: the (S, order) state ids, flattened column by column
+        - state_sizes: number of transitions of each state
+        - next_ids, counts: one entry per transition, states in sorted order
+        - start_ids: the (K, order) start state ids, flattened column by column
+        """
+        pa, pq = _require_pyarrow()
+        state_ids, state_ptr, next_ids, counts = self._transition_arrays()
+        columns = {
+            "vocab": self._inv_vocab,
+            "state_ids": state_ids.T.ravel(),
+            "state_sizes": np.diff(state_ptr).astype(np.int32),
+            "next_ids": next_ids,
+            "counts": counts,
+            "start_ids": self._start_array().T.ravel(),
+        }
+        table = pa.table(
+            {name: pa.array([values]) for name, values in columns.items()},
+            metadata={"version": "3", "order": str(self.order)},
+        )
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Sorted states make the first state column nearly monotonic, which
+        # delta encoding shrinks well
+        pq.write_table(
+            table,
+            path,
+            compression="zstd",
+            use_dictionary=["vocab"],
+            column_encoding={"state_ids": "DELTA_BINARY_PACKED"},
+        )
+
+    @classmethod
+    def load_parquet(cls, path: str) -> "MarkovChain":
+        _, pq = _require_pyarrow()
+        table = pq.read_table(path)
+        metadata = table.schema.metadata or {}
+        if metadata.get(b"version") != b"3":
+            raise ValueError(f"Unsupported Parquet model version: {metadata.get(b'version')!r}")
+        order = int(metadata[b"order"])
+        mc = cls(order=order)
+
+        def column(name: str) -> np.ndarray:
+            return table.column(name).combine_chunks().flatten().to_numpy().astype(np.int32)
+
+        vocab = table.column("vocab").combine_chunks().flatten().to_pylist()
+        if tuple(vocab[: len(_PUNCT_TOKENS)]) != _PUNCT_TOKENS:
+            raise ValueError("Parquet model vocab must start with the punctuation tokens")
+        mc._inv_vocab = vocab
+        mc._vocab = {t: i for i, t in enumerate(vocab)}
+        state_ids = column("state_ids").reshape(order, -1).T
+        sizes = column("state_sizes")
+        next_ids = column("next_ids")
+        counts = column("counts")
+        mc._start_rows = [column("start_ids").reshape(order, -1).T.copy()]
+        # Rows are stored sorted and distinct, so they become the counts
+        # as-is; text order is lost and falls back to sorted order
+        mc._rows = np.column_stack((np.repeat(state_ids, sizes, axis=0), next_ids))
+        mc._row_counts = counts.astype(np.int64)
+        mc._row_first = np.arange(len(next_ids), dtype=np.int64)
+        mc._n_merged = len(next_ids)
+        state_ptr = np.zeros(len(sizes) + 1, dtype=np.int32)
+        np.cumsum(sizes, out=state_ptr[1:])
+        mc._build_tables(np.ascontiguousarray(state_ids), state_ptr, next_ids, counts)
         return mc
 
     def save(self, path: str):
         """
-        Save as JSON or gzipped JSON, based on file extension.
+        Save as JSON, compressed JSON or Parquet, based on file extension.
         - .json -> plain JSON
         - .json.gz or .gz -> gzipped JSON
+        - .json.zst or .zst -> zstd-compressed JSON (requires zstandard)
+        - .parquet -> columnar binary (see save_parquet; requires pyarrow)
         """
-        data = self.to_dict()
+        if path.endswith(".parquet"):
+            self.save_parquet(path)
+            return
         os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-        if path.endswith(".gz"):
-            with gzip.open(path, "wt", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False)
+        if path.endswith(".zst"):
+            _require_zstandard()
+            cctx = zstd.ZstdCompressor(level=_ZSTD_LEVEL)
+            with zstd.open(path, "wt", cctx=cctx, encoding="utf-8") as f:
+                self._write_json(f)
+        elif path.endswith(".gz"):
+            raw = io.BufferedWriter(gzip.GzipFile(path, "wb"), buffer_size=_IO_BUFFER_SIZE)
+            with io.TextIOWrapper(raw, encoding="utf-8") as f:
+                self._write_json(f)
         else:
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False)
+            with open(path, "w", encoding="utf-8", buffering=_IO_BUFFER_SIZE) as f:
+                self._write_json(f)
 
     @classmethod
     def load(cls, path: str) -> "MarkovChain":
-        if path.endswith(".gz"):
+        if path.endswith(".parquet"):
+            return cls.load_parquet(path)
+        if path.endswith(".zst"):
+            _require_zstandard()
+            with zstd.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        elif path.endswith(".gz"):
             with gzip.open(path, "rt", encoding="utf-8") as f:
                 data = json.load(f)
         else:
             with open(path, "r", encoding="utf-8") as f:
                 data = json.load(f)
-        return cls.from_dict(data)
\ No newline at end of file
+        return cls.from_dict(data)
+
+
+def _row_keys(rows: np.ndarray, base: int) -> np.ndarray:
+    """
+    One int64 key per row of a 2-D id array (ids < base) that sorts and
+    compares exactly like the rows do lexicographically. Columns are packed
+    in base `base` while the key fits in an int64; past that, the key so
+    far is replaced by its dense rank (< len(rows)) and packing continues.
+    """
+    limit = np.iinfo(np.int64).max
+    keys = rows[:, 0].astype(np.int64)
+    bound = base
+    for col in range(1, rows.shape[1]):
+        if bound > limit // base:
+            _, keys = np.unique(keys, return_inverse=True)
+            bound = max(len(rows), 1)
+        keys = keys * base + rows[:, col]
+        bound *= base
+    return keys
+
+
+def _sum_rows(
+    rows: np.ndarray, counts: np.ndarray, first_seen: np.ndarray, base: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Distinct rows of `rows` in sorted order, with the summed `counts` and
+    the `first_seen` of the earliest copy of each. `first_seen` must be
+    increasing, so the earliest copy is also the first one.
+    """
+    _, first, inverse = np.unique(_row_keys(rows, base), return_index=True, return_inverse=True)
+    counts = np.bincount(inverse, weights=counts, minlength=len(first)).astype(np.int64)
+    return rows[first], counts, first_seen[first]
+
+
+def _find_rows(table: np.ndarray, rows: np.ndarray, base: int) -> np.ndarray:
+    """
+    Index of each of `rows` in `table`, an array of distinct rows in sorted
+    order, or -1 where a row is missing; one searchsorted over row keys.
+    """
+    keys = _row_keys(np.concatenate((table, rows)), base)
+    table_keys, keys = keys[: len(table)], keys[len(table) :]
+    # Searching in sorted order walks `table_keys` front to back, several
+    # times faster on large tables than scattered binary searches
+    by_key = np.argsort(keys)
+    idx = np.empty(len(keys), dtype=np.intp)
+    idx[by_key] = np.searchsorted(table_keys, keys[by_key])
+    found = idx < len(table_keys)
+    found[found] = table_keys[idx[found]] == keys[found]
+    return np.where(found, idx, -1).astype(np.int32)
+
+
+def _split_states(keys: Iterable[str]) -> List[str]:
+    """Tokens of '|||'-joined state strings, flattened in order."""
+    joined = "|||".join(keys)
+    return joined.split("|||") if joined else []
+
+
+def _require_zstandard():
+    if zstd is None:
+        raise ImportError("zstandard is required for .zst models: pip install zstandard")
+
+
+def _require_pyarrow():
+    # Imported here rather than at module level: pyarrow is slow to import
+    # and only Parquet models need it
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("pyarrow is required for .parquet models: pip install pyarrow") from None
+    return pa, pq
+
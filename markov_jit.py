@@ -0,0 +1,43 @@
+"""
+numba-compiled Markov sampling kernel; see markov_kernel.pyx for the Cython
+twin. markov imports this on first use, so numba stays optional.
+"""
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def sample_path(state_ptr, next_ids, cum_weights, next_sids, is_alpha, start_ids, start_sids, n_words, seed):
+    """
+    Walk the CSR chain from random starts until `n_words` alpha tokens
+    have been emitted; returns every emitted token id, punctuation
+    included. A state id of -1 (no transitions) restarts the walk.
+    """
+    np.random.seed(seed)
+    order = start_ids.shape[1]
+    out = np.empty(n_words * 4 + order, dtype=np.int32)
+    n = 0
+    alpha_n = 0
+    sid = -1
+    while alpha_n < n_words:
+        if n + order > out.shape[0]:
+            grown = np.empty(out.shape[0] * 2, dtype=np.int32)
+            grown[:n] = out[:n]
+            out = grown
+        if sid < 0:
+            k = np.random.randint(0, start_sids.shape[0])
+            for j in range(order):
+                out[n] = start_ids[k, j]
+                alpha_n += is_alpha[start_ids[k, j]]
+                n += 1
+            sid = start_sids[k]
+            continue
+        lo = state_ptr[sid]
+        hi = state_ptr[sid + 1]
+        r = np.random.randint(0, cum_weights[hi - 1])
+        e = lo + np.searchsorted(cum_weights[lo:hi], r, side="right")
+        out[n] = next_ids[e]
+        alpha_n += is_alpha[next_ids[e]]
+        n += 1
+        sid = next_sids[e]
+    return out[:n]
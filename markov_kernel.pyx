@@ -0,0 +1,83 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+Native Markov sampling kernel; see markov_jit.sample_path for the numba twin.
+
+Build in place with `python build_kernel.py`.
+"""
+import numpy as np
+from libc.stdint cimport int32_t, uint8_t, uint64_t
+
+
+cdef inline uint64_t _splitmix64(uint64_t* state) nogil:
+    state[0] += 0x9E3779B97F4A7C15ULL
+    cdef uint64_t z = state[0]
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL
+    return z ^ (z >> 31)
+
+
+cdef inline Py_ssize_t _search_right(const int32_t[::1] a, Py_ssize_t lo, Py_ssize_t hi, int32_t r) nogil:
+    # first index in [lo, hi) with a[i] > r
+    cdef Py_ssize_t mid
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if a[mid] <= r:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+cpdef int32_t[::1] sample_ids(
+    const int32_t[::1] state_ptr,
+    const int32_t[::1] next_ids,
+    const int32_t[::1] cum_weights,
+    const int32_t[::1] next_sids,
+    const uint8_t[::1] is_alpha,
+    const int32_t[:, ::1] start_ids,
+    const int32_t[::1] start_sids,
+    int n_words,
+    uint64_t seed,
+):
+    """
+    Walk the CSR chain from random starts until `n_words` alpha tokens have
+    been emitted; returns every emitted token id, punctuation included. A
+    state id of -1 (no transitions) restarts the walk.
+    """
+    cdef Py_ssize_t order = start_ids.shape[1]
+    cdef Py_ssize_t n_starts = start_sids.shape[0]
+    cdef Py_ssize_t cap = n_words * 4 + order
+    cdef int32_t[::1] out = np.empty(cap, dtype=np.int32)
+    cdef int32_t[::1] grown
+    cdef Py_ssize_t n = 0, k, j, lo, hi, e
+    cdef int alpha_n = 0
+    cdef int32_t sid = -1, tok, r
+    cdef uint64_t rng = seed
+
+    while alpha_n < n_words:
+        if n + order > cap:
+            cap *= 2
+            grown = np.empty(cap, dtype=np.int32)
+            grown[:n] = out[:n]
+            out = grown
+        with nogil:
+            while alpha_n < n_words and n + order <= cap:
+                if sid < 0:
+                    k = <Py_ssize_t>(_splitmix64(&rng) % <uint64_t>n_starts)
+                    for j in range(order):
+                        tok = start_ids[k, j]
+                        out[n] = tok
+                        alpha_n += is_alpha[tok]
+                        n += 1
+                    sid = start_sids[k]
+                    continue
+                lo = state_ptr[sid]
+                hi = state_ptr[sid + 1]
+                r = <int32_t>(_splitmix64(&rng) % <uint64_t>cum_weights[hi - 1])
+                e = _search_right(cum_weights, lo, hi, r)
+                tok = next_ids[e]
+                out[n] = tok
+                alpha_n += is_alpha[tok]
+                n += 1
+                sid = next_sids[e]
+    return out[:n]
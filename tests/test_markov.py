@@ -0,0 +1,259 @@
+import gzip
+import json
+import pickle
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import markov
+from markov import MarkovChain
+
+TEXT = (
+    "The quick brown fox jumps over the lazy dog. Was it quick? It was! "
+    "The dog didn't mind, and the fox ran on. Café owners saw the fox... "
+    "the dog slept!? Then the quick fox came back. The end."
+) * 20
+
+
+def _snapshot(mc: MarkovChain):
+    return {state: dict(next_map) for state, next_map in mc.transitions.items()}, list(mc.starts)
+
+
+def _split(text: str, rng: random.Random, n_cuts: int):
+    cuts = sorted(rng.randrange(len(text) + 1) for _ in range(n_cuts))
+    return [text[lo:hi] for lo, hi in zip([0, *cuts], [*cuts, len(text)])]
+
+
+@pytest.mark.parametrize("order", [1, 2, 3])
+@pytest.mark.parametrize("seed", range(5))
+def test_add_stream_matches_add_text(order, seed):
+    # Cuts land mid-word, between punctuation runs and on empty chunks
+    expected = MarkovChain(order)
+    expected.add_text(TEXT)
+    streamed = MarkovChain(order)
+    streamed.add_stream(_split(TEXT, random.Random(seed), n_cuts=200))
+    assert _snapshot(streamed) == _snapshot(expected)
+
+
+@pytest.mark.parametrize("order", [1, 3])
+def test_add_stream_one_char_chunks(order):
+    expected = MarkovChain(order)
+    expected.add_text(TEXT[:2000])
+    streamed = MarkovChain(order)
+    streamed.add_stream(iter(TEXT[:2000]))
+    assert _snapshot(streamed) == _snapshot(expected)
+
+
+def test_add_stream_short_input():
+    for text in ["", "word", "two words", "one. two"]:
+        expected = MarkovChain(2)
+        expected.add_text(text)
+        streamed = MarkovChain(2)
+        streamed.add_stream(list(text))
+        assert _snapshot(streamed) == _snapshot(expected)
+
+
+def test_merges_match_single_pass(monkeypatch):
+    # Merge pending windows after every chunk instead of once at the end
+    expected = MarkovChain(2)
+    expected.add_stream(_split(TEXT, random.Random(0), n_cuts=50))
+    monkeypatch.setattr(markov, "_MERGE_MIN_ROWS", 1)
+    merged = MarkovChain(2)
+    merged.add_stream(_split(TEXT, random.Random(0), n_cuts=50))
+    assert _snapshot(merged) == _snapshot(expected)
+    # Text order survives the merges, so saved JSON is unchanged too
+    assert merged.to_dict() == expected.to_dict()
+    assert list(merged.transitions) == list(expected.transitions)
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    mc = MarkovChain(3)
+    mc.add_text(TEXT)
+    path = str(tmp_path / "model.parquet")
+    mc.save(path)
+    loaded = MarkovChain.load(path)
+    assert _snapshot(loaded) == _snapshot(mc)
+    # Loading builds the sampling tables, so both walk the same chain
+    assert loaded.generate_words(50, random.Random(1)) == mc.generate_words(50, random.Random(1))
+    loaded.add_text("the dog ran on.")
+    mc.add_text("the dog ran on.")
+    assert _snapshot(loaded) == _snapshot(mc)
+
+
+def test_generate_empty_requests():
+    mc = MarkovChain(2)
+    mc.add_text(TEXT)
+    assert mc.generate_words_batch(3, 0, random.Random(0)) == [[], [], []]
+    assert mc.generate_words_batch(0, 5, random.Random(0)) == []
+    assert mc.generate_seed_texts(2, n_words=0, rng=random.Random(0)) == ["", ""]
+    assert mc.generate_seed_texts(0, rng=random.Random(0)) == []
+
+
+def test_seeded_output_ignores_call_history():
+    mc = MarkovChain(2)
+    mc.add_text(TEXT)
+    before = mc.generate_seed_texts(3, 12, random.Random(42))
+    if markov._load_sampler() is not None:
+        mc.generate_words(1 << 16, random.Random(0), compiled=True)
+    assert mc.generate_seed_texts(3, 12, random.Random(42)) == before
+    assert mc.generate_seed_text(12, random.Random(42)) == mc.generate_seed_text(12, random.Random(42))
+
+
+def test_iter_file_chunks_matches_joined_text(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(markov, "_IO_BUFFER_SIZE", 7)
+    paths = []
+    for i, part in enumerate([TEXT[:500], TEXT[500:1300]]):
+        paths.append(tmp_path / f"part{i}.txt")
+        paths[-1].write_text(part, encoding="utf-8")
+    missing = tmp_path / "missing.txt"
+    expected = MarkovChain(2)
+    expected.add_text(f"{TEXT[:500]}\n{TEXT[500:1300]}\n")
+    streamed = MarkovChain(2)
+    streamed.add_stream(markov.iter_file_chunks([paths[0], missing, paths[1]]))
+    assert _snapshot(streamed) == _snapshot(expected)
+    assert "failed to read" in capsys.readouterr().out
+
+
+def _baseline_dict(text: str, order: int) -> dict:
+    # The original dict-of-dicts builder and to_dict(), kept as the reference
+    # for the JSON format
+    tokens = markov.tokenize(text)
+    transitions: dict = {}
+    starts = []
+    if len(tokens) > order:
+        sent_starts = [0] + [i + 1 for i, tok in enumerate(tokens) if tok in (".", "?", "!") and i + 1 < len(tokens)]
+        starts = [tuple(tokens[s : s + order]) for s in sent_starts if s + order < len(tokens)]
+        for i in range(len(tokens) - order):
+            next_map = transitions.setdefault(tuple(tokens[i : i + order]), {})
+            next_map[tokens[i + order]] = next_map.get(tokens[i + order], 0) + 1
+    return {
+        "version": 1,
+        "order": order,
+        "starts": ["|||".join(state) for state in starts],
+        "transitions": {"|||".join(state): next_map for state, next_map in transitions.items()},
+    }
+
+
+def _compress(ext: str, raw: bytes) -> bytes:
+    if ext == ".json.gz":
+        return gzip.compress(raw)
+    if ext == ".json.zst":
+        return pytest.importorskip("zstandard").ZstdCompressor().compress(raw)
+    return raw
+
+
+def _decompress(ext: str, data: bytes) -> bytes:
+    if ext == ".json.gz":
+        return gzip.decompress(data)
+    if ext == ".json.zst":
+        return pytest.importorskip("zstandard").ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+@pytest.mark.parametrize("ext", [".json", ".json.gz", ".json.zst"])
+@pytest.mark.parametrize("order", [1, 2, 3, 5])
+def test_baseline_json_round_trip(tmp_path, ext, order):
+    data = _baseline_dict(TEXT, order)
+    raw = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    path = tmp_path / f"baseline{ext}"
+    path.write_bytes(_compress(ext, raw))
+    loaded = MarkovChain.load(str(path))
+    assert loaded.to_dict() == data
+    # Built from text, the chain serializes to the same bytes, key order included
+    built = MarkovChain(order)
+    built.add_text(TEXT)
+    assert json.dumps(built.to_dict(), ensure_ascii=False).encode("utf-8") == raw
+    out = tmp_path / f"saved{ext}"
+    loaded.save(str(out))
+    assert _decompress(ext, out.read_bytes()) == raw
+
+
+def test_row_keys_dense_rank_fallback():
+    # 7 columns in base 1000 overflow int64 packing, so ranks take over
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, 1000, size=(5000, 7), dtype=np.int32)
+    rows[2500:] = rows[:2500]
+    rows[:, :3] %= 3
+    keys = markov._row_keys(rows, 1000)
+    by_key = rows[np.argsort(keys, kind="stable")]
+    assert (by_key == rows[np.lexsort(rows.T[::-1])]).all()
+    assert len(np.unique(keys)) == len(np.unique(rows, axis=0))
+
+
+def test_high_order_large_vocab_chain():
+    rng = random.Random(0)
+    vocab = [f"w{''.join(rng.choice('abcdefghij') for _ in range(6))}" for _ in range(800)]
+    words = [rng.choice(vocab[:40]) if rng.random() < 0.7 else rng.choice(vocab) for _ in range(20000)]
+    text = " ".join(w + "." if rng.random() < 0.1 else w for w in words)
+    mc = MarkovChain(6)
+    mc.add_text(text)
+    assert len(mc._inv_vocab) ** 7 > np.iinfo(np.int64).max
+    assert mc.to_dict() == _baseline_dict(text, 6)
+    # Each edge leads to the state its state shifted by the next token
+    mc.finalize()
+    state_ids, state_ptr, next_ids, _ = mc._transition_arrays()
+    index = {tuple(state): sid for sid, state in enumerate(state_ids.tolist())}
+    edge_states = np.repeat(state_ids, np.diff(state_ptr), axis=0)[:, 1:].tolist()
+    expected = [index.get((*state, nxt), -1) for state, nxt in zip(edge_states, next_ids.tolist())]
+    assert mc._next_sids.tolist() == expected
+    assert mc._start_sids.tolist() == [index[tuple(state)] for state in mc._start_ids.tolist()]
+
+
+# "x" is followed by a, b and c in a 5:3:2 ratio; every other token by "x"
+WEIGHTED_TEXT = " ".join(f"x {nxt}" for nxt in "aaaaabbbcc") + " x"
+WEIGHTS = {"a": 0.5, "b": 0.3, "c": 0.2}
+
+
+def _after_x(tokens) -> dict:
+    following = Counter(nxt for tok, nxt in zip(tokens, tokens[1:]) if tok == "x")
+    total = sum(following.values())
+    return {tok: n / total for tok, n in following.items()}
+
+
+def _assert_weighted(freqs: dict):
+    assert freqs.keys() == WEIGHTS.keys()
+    for tok, p in WEIGHTS.items():
+        assert abs(freqs[tok] - p) < 0.01
+
+
+def test_python_sampler_frequencies():
+    mc = MarkovChain(1)
+    mc.add_text(WEIGHTED_TEXT)
+    _assert_weighted(_after_x(mc.generate_words(200_000, random.Random(0))))
+
+
+def test_sample_many_frequencies():
+    mc = MarkovChain(1)
+    mc.add_text(WEIGHTED_TEXT)
+    mc.finalize()
+    sid = mc._start_sids[0]
+    nxt, _ = mc.sample_many(np.full(100_000, sid, dtype=np.int32), np.random.default_rng(0))
+    inv = mc._inv_vocab
+    _assert_weighted(_after_x(["x", *[tok for i in nxt.tolist() for tok in (inv[i], "x")]]))
+
+
+@pytest.mark.parametrize("module, name", [("markov_jit", "sample_path"), ("markov_kernel", "sample_ids")])
+def test_compiled_sampler_frequencies(module, name):
+    sample = getattr(pytest.importorskip(module), name)
+    mc = MarkovChain(1)
+    mc.add_text(WEIGHTED_TEXT)
+    mc.finalize()
+    ids = sample(
+        mc._state_ptr, mc._next_ids, mc._cum_weights, mc._next_sids,
+        mc._is_alpha, mc._start_ids, mc._start_sids, 200_000, 0,
+    )
+    inv = mc._inv_vocab
+    _assert_weighted(_after_x([inv[i] for i in np.asarray(ids).tolist()]))
+
+
+def test_pickle_after_reading_views():
+    mc = MarkovChain(2)
+    mc.add_text(TEXT)
+    mc.transitions, mc.starts
+    mc.generate_words(20, random.Random(0))
+    restored = pickle.loads(pickle.dumps(mc))
+    assert _snapshot(restored) == _snapshot(mc)
+    assert restored.generate_words(20, random.Random(1)) == mc.generate_words(20, random.Random(1))